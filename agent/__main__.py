@@ -1,30 +1,35 @@
 import asyncio
+from pathlib import Path
 from langchain_core.messages import SystemMessage, HumanMessage
+from agent.chess_api import close_session
 from agent.graph import graph
 
 
-async def main():
-    with open("agent/system_prompt.jinja", "r") as f:
-        system_prompt = f.read()
+# Read the system prompt once at import; the message is shared by all sessions
+with open(Path(__file__).parent / "system_prompt.jinja", "r") as f:
+    SYSTEM_PROMPT = f.read()
+
+_SYSTEM_MSG = SystemMessage(content=SYSTEM_PROMPT)
+
 
+async def main():
     state = {
-        "messages": [
-            SystemMessage(
-                content=system_prompt
-            )
-        ],
+        "messages": [_SYSTEM_MSG],
         "current_position": "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
     }
 
-    while True:
-        # read and append user message"
-        new_message = input("User: ")
-        state["messages"].append(HumanMessage(content=new_message))
-
-        # receive new state
-        state = await graph.ainvoke(state)
-        assistant_message = state["messages"][-1].content
-        print(f"Assistant: {assistant_message}")
+    try:
+        while True:
+            # read and append user message"
+            new_message = await asyncio.to_thread(input, "User: ")
+            state["messages"].append(HumanMessage(content=new_message))
+
+            # receive new state
+            state = await graph.ainvoke(state)
+            assistant_message = state["messages"][-1].content
+            print(f"Assistant: {assistant_message}")
+    finally:
+        await close_session()
 
 
 
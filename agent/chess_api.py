@@ -5,10 +5,20 @@ This module provides functions to interact with the Chess-API.com service,
 which offers Stockfish 17 NNUE chess engine analysis via REST API.
 """
 
-import json
-from typing import Dict, Any, Optional, List
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Any, Optional, List, Tuple
 import aiohttp
 import chess
+import orjson
+
+
+# API endpoint used when callers do not pass api_url
+API_URL = os.getenv("CHESS_API_URL", "https://chess-api.com/v1")
 
 
 class ChessAPIError(Exception):
@@ -16,6 +26,118 @@ class ChessAPIError(Exception):
     pass
 
 
+# Shared HTTP session, created lazily so that connections (and DNS lookups)
+# to the API are pooled and kept alive across calls.
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def _get_session() -> aiohttp.ClientSession:
+    """
+    Return the shared aiohttp session, creating it on first use.
+
+    Returns:
+        The module-level aiohttp.ClientSession
+    """
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=100,
+                ttl_dns_cache=300,
+                keepalive_timeout=60,
+            ),
+            timeout=aiohttp.ClientTimeout(total=30),
+        )
+    return _session
+
+
+async def close_session() -> None:
+    """
+    Close the shared aiohttp session.
+
+    Should be called once on shutdown. A new session is created automatically
+    if the API is used again afterwards.
+    """
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+
+# LRU cache of analysis results. Engine output for a given request is
+# deterministic enough to reuse for a few minutes, and the HTTP round-trip
+# dominates the cost of every helper below.
+_CACHE_MAX = 1024
+_CACHE_TTL = 300  # seconds
+_ANALYSIS_CACHE: "OrderedDict[tuple, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+# Per-key locks so that concurrent misses for the same request share one call,
+# with the number of callers using each lock
+_CACHE_LOCKS: Dict[tuple, List[Any]] = {}
+# Calls answered from the cache vs. calls that had to query the API
+_CACHE_STATS = {"hits": 0, "misses": 0}
+
+
+def _cache_get(key: tuple) -> Optional[Dict[str, Any]]:
+    """Return a cached analysis result, or None if missing or expired."""
+    entry = _ANALYSIS_CACHE.get(key)
+    if entry is None:
+        return None
+    stored_at, result = entry
+    if time.monotonic() - stored_at > _CACHE_TTL:
+        del _ANALYSIS_CACHE[key]
+        return None
+    _ANALYSIS_CACHE.move_to_end(key)
+    _CACHE_STATS["hits"] += 1
+    return result
+
+
+def _cache_put(key: tuple, result: Dict[str, Any]) -> None:
+    """Store an analysis result, evicting the least recently used entries."""
+    _ANALYSIS_CACHE[key] = (time.monotonic(), result)
+    _ANALYSIS_CACHE.move_to_end(key)
+    while len(_ANALYSIS_CACHE) > _CACHE_MAX:
+        _ANALYSIS_CACHE.popitem(last=False)
+
+
+def clear_analysis_cache() -> None:
+    """Drop all cached analysis results and reset the statistics."""
+    _ANALYSIS_CACHE.clear()
+    _CACHE_STATS["hits"] = _CACHE_STATS["misses"] = 0
+
+
+def analysis_cache_info() -> Dict[str, int]:
+    """
+    Report how effective the analysis cache has been.
+
+    Returns:
+        Dictionary with fields:
+        - hits (int): Calls answered from the cache, including calls that
+          waited for a concurrent identical request
+        - misses (int): Calls that sent a request to the API
+        - size (int): Number of cached results
+    """
+    return {**_CACHE_STATS, "size": len(_ANALYSIS_CACHE)}
+
+
+# (variants, depth, max_thinking_time) defaults of analyze_position
+_DEFAULT_PARAMS = (1, 12, 50)
+
+
+def _validate_params(variants: int, depth: int, max_thinking_time: int) -> None:
+    """
+    Check analysis parameters against the limits of the API.
+
+    Raises:
+        ValueError: If any parameter is out of range
+    """
+    if variants < 1 or variants > 5:
+        raise ValueError("variants must be between 1 and 5")
+    if depth < 1 or depth > 18:
+        raise ValueError("depth must be between 1 and 18")
+    if max_thinking_time < 1 or max_thinking_time > 100:
+        raise ValueError("max_thinking_time must be between 1 and 100")
+
+
 async def analyze_position(
     fen: Optional[str] = None,
     input_text: Optional[str] = None,
@@ -23,10 +145,14 @@ async def analyze_position(
     depth: int = 12,
     max_thinking_time: int = 50,
     searchmoves: str = "",
-    api_url: str = "https://chess-api.com/v1"
+    api_url: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Analyze a chess position using the Chess-API.
+
+    Results are cached in-process for a few minutes, and concurrent calls with
+    the same arguments share a single API request. The returned dictionary
+    may be shared between callers and must not be modified.
     
     Args:
         fen: FEN string representing the chess position
@@ -38,7 +164,7 @@ async def analyze_position(
             - depth 20 ≈ 2850 FIDE (GM Carlsen level)
         max_thinking_time: Maximum thinking time in ms (max: 100, default: 50)
         searchmoves: Evaluate specific moves only, e.g., 'd2d4 e2e4'
-        api_url: API endpoint URL
+        api_url: API endpoint URL (defaults to API_URL)
         
     Returns:
         Dictionary containing analysis results with fields:
@@ -79,17 +205,64 @@ async def analyze_position(
         ... )
         >>> print(f"Best move: {result['san']} (eval: {result['eval']})")
     """
+    api_url = api_url or API_URL
+    key = (fen, input_text, variants, depth, max_thinking_time, searchmoves, api_url)
+    # Invalid arguments never make it into the cache, so hits need no validation
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
     if not fen and not input_text:
         raise ValueError("Either 'fen' or 'input_text' must be provided")
     
-    # Validate parameters
-    if variants < 1 or variants > 5:
-        raise ValueError("variants must be between 1 and 5")
-    if depth < 1 or depth > 18:
-        raise ValueError("depth must be between 1 and 18")
-    if max_thinking_time < 1 or max_thinking_time > 100:
-        raise ValueError("max_thinking_time must be between 1 and 100")
-    
+    # Validate parameters; the defaults are known to be valid
+    if (variants, depth, max_thinking_time) != _DEFAULT_PARAMS:
+        _validate_params(variants, depth, max_thinking_time)
+
+    entry = _CACHE_LOCKS.setdefault(key, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            # Another caller may have filled the cache while we were waiting
+            cached = _cache_get(key)
+            if cached is not None:
+                return cached
+
+            _CACHE_STATS["misses"] += 1
+            result = await _request_analysis(
+                fen=fen,
+                input_text=input_text,
+                variants=variants,
+                depth=depth,
+                max_thinking_time=max_thinking_time,
+                searchmoves=searchmoves,
+                api_url=api_url,
+            )
+            _cache_put(key, result)
+            return result
+    finally:
+        # Drop the lock with its last user. Until then new callers must join
+        # it, also when the request failed and the waiters retry.
+        entry[1] -= 1
+        if not entry[1]:
+            del _CACHE_LOCKS[key]
+
+
+async def _request_analysis(
+    fen: Optional[str],
+    input_text: Optional[str],
+    variants: int,
+    depth: int,
+    max_thinking_time: int,
+    searchmoves: str,
+    api_url: str,
+) -> Dict[str, Any]:
+    """
+    Send an analysis request to the Chess-API, bypassing the cache.
+
+    Arguments are the same as for analyze_position and are assumed to be
+    already validated.
+    """
     # Build request payload
     payload: Dict[str, Any] = {
         "variants": variants,
@@ -103,39 +276,45 @@ async def analyze_position(
         payload["input"] = input_text
     if searchmoves:
         payload["searchmoves"] = searchmoves
-    
+
+    # Only the network exchange is guarded; parsing and checking the result
+    # run outside of it
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                api_url,
-                json=payload,
-                headers={"Content-Type": "application/json"}
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise ChessAPIError(
-                        f"API request failed with status {response.status}: {error_text}"
-                    )
-                
-                result = await response.json()
-                
-                # Check if the API returned an error
-                if isinstance(result, dict) and result.get("type") == "error":
-                    error_msg = result.get("text", "Unknown error")
-                    error_code = result.get("error", "UNKNOWN_ERROR")
-                    raise ChessAPIError(f"API error ({error_code}): {error_msg}")
-                
-                return result
-    except aiohttp.ClientError as e:
+        session = _get_session()
+        async with session.post(
+            api_url,
+            json=payload,
+            headers={"Content-Type": "application/json"}
+        ) as response:
+            status = response.status
+            body = await response.read()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         raise ChessAPIError(f"Network error during API request: {str(e)}")
-    except json.JSONDecodeError as e:
+    
+    if status != 200:
+        error_text = body.decode("utf-8", errors="replace")
+        raise ChessAPIError(
+            f"API request failed with status {status}: {error_text}"
+        )
+    
+    try:
+        result = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
         raise ChessAPIError(f"Failed to parse API response: {str(e)}")
+    
+    # Check if the API returned an error
+    if isinstance(result, dict) and result.get("type") == "error":
+        error_msg = result.get("text", "Unknown error")
+        error_code = result.get("error", "UNKNOWN_ERROR")
+        raise ChessAPIError(f"API error ({error_code}): {error_msg}")
+    
+    return result
 
 
 async def get_best_move(
     fen: str,
     depth: int = 12,
-    api_url: str = "https://chess-api.com/v1"
+    api_url: Optional[str] = None
 ) -> str:
     """
     Get the best move for a position.
@@ -143,7 +322,7 @@ async def get_best_move(
     Args:
         fen: FEN string representing the chess position
         depth: Analysis depth (max: 18, default: 12)
-        api_url: API endpoint URL
+        api_url: API endpoint URL (defaults to API_URL)
         
     Returns:
         Best move in UCI notation (e.g., 'e2e4')
@@ -162,7 +341,7 @@ async def get_best_move(
 async def get_best_move_san(
     fen: str,
     depth: int = 12,
-    api_url: str = "https://chess-api.com/v1"
+    api_url: Optional[str] = None
 ) -> str:
     """
     Get the best move in standard algebraic notation (SAN).
@@ -170,7 +349,7 @@ async def get_best_move_san(
     Args:
         fen: FEN string representing the chess position
         depth: Analysis depth (max: 18, default: 12)
-        api_url: API endpoint URL
+        api_url: API endpoint URL (defaults to API_URL)
         
     Returns:
         Best move in SAN (e.g., 'e4', 'Nf3', 'O-O')
@@ -189,7 +368,7 @@ async def get_best_move_san(
 async def get_position_evaluation(
     fen: str,
     depth: int = 12,
-    api_url: str = "https://chess-api.com/v1"
+    api_url: Optional[str] = None
 ) -> float:
     """
     Get the evaluation score for a position.
@@ -197,7 +376,7 @@ async def get_position_evaluation(
     Args:
         fen: FEN string representing the chess position
         depth: Analysis depth (max: 18, default: 12)
-        api_url: API endpoint URL
+        api_url: API endpoint URL (defaults to API_URL)
         
     Returns:
         Evaluation score (negative = black winning, positive = white winning)
@@ -217,7 +396,7 @@ async def get_position_evaluation(
 async def get_win_chance(
     fen: str,
     depth: int = 12,
-    api_url: str = "https://chess-api.com/v1"
+    api_url: Optional[str] = None
 ) -> float:
     """
     Get the winning chance percentage for the current position.
@@ -225,7 +404,7 @@ async def get_win_chance(
     Args:
         fen: FEN string representing the chess position
         depth: Analysis depth (max: 18, default: 12)
-        api_url: API endpoint URL
+        api_url: API endpoint URL (defaults to API_URL)
         
     Returns:
         Winning chance percentage (50 = equal, >50 = white winning, <50 = black winning)
@@ -244,7 +423,7 @@ async def get_win_chance(
 async def check_for_mate(
     fen: str,
     depth: int = 12,
-    api_url: str = "https://chess-api.com/v1"
+    api_url: Optional[str] = None
 ) -> Optional[int]:
     """
     Check if there's a forced mate sequence in the position.
@@ -252,7 +431,7 @@ async def check_for_mate(
     Args:
         fen: FEN string representing the chess position
         depth: Analysis depth (max: 18, default: 12)
-        api_url: API endpoint URL
+        api_url: API endpoint URL (defaults to API_URL)
         
     Returns:
         Number of moves to mate (positive = white mates, negative = black mates)
@@ -280,7 +459,7 @@ async def check_for_mate(
 async def get_continuation(
     fen: str,
     depth: int = 12,
-    api_url: str = "https://chess-api.com/v1"
+    api_url: Optional[str] = None
 ) -> List[str]:
     """
     Get the continuation line (sequence of best moves) from the position.
@@ -288,7 +467,7 @@ async def get_continuation(
     Args:
         fen: FEN string representing the chess position
         depth: Analysis depth (max: 18, default: 12)
-        api_url: API endpoint URL
+        api_url: API endpoint URL (defaults to API_URL)
         
     Returns:
         List of moves in UCI notation representing the best continuation
@@ -308,7 +487,7 @@ async def analyze_specific_moves(
     fen: str,
     moves: List[str],
     depth: int = 12,
-    api_url: str = "https://chess-api.com/v1"
+    api_url: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Analyze only specific moves from a position.
@@ -317,7 +496,7 @@ async def analyze_specific_moves(
         fen: FEN string representing the chess position
         moves: List of moves to analyze in UCI notation (e.g., ['e2e4', 'd2d4'])
         depth: Analysis depth (max: 18, default: 12)
-        api_url: API endpoint URL
+        api_url: API endpoint URL (defaults to API_URL)
         
     Returns:
         Analysis result focusing on the specified moves
@@ -344,7 +523,7 @@ async def analyze_specific_moves(
 async def get_full_analysis(
     fen: str,
     depth: int = 12,
-    api_url: str = "https://chess-api.com/v1"
+    api_url: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Get comprehensive analysis of a position including all available information.
@@ -354,7 +533,7 @@ async def get_full_analysis(
     Args:
         fen: FEN string representing the chess position
         depth: Analysis depth (max: 18, default: 12)
-        api_url: API endpoint URL
+        api_url: API endpoint URL (defaults to API_URL)
         
     Returns:
         Complete analysis dictionary with all fields
@@ -369,6 +548,70 @@ async def get_full_analysis(
     return await analyze_position(fen=fen, depth=depth, api_url=api_url)
 
 
+# Translation table expanding empty-square counts into runs of NUL bytes, so
+# that a valid rank becomes exactly one character per square
+_EXPAND = str.maketrans({str(n): "\0" * n for n in range(1, 9)})
+_RANK_CHARS = frozenset("pnbrqkPNBRQK12345678")
+# Well-formed piece placement field: 8 ranks of valid characters. Square
+# counts per rank are still checked by _decode_rank.
+_PLACEMENT_RE = re.compile(r"\s*((?:[pnbrqkPNBRQK1-8]+/){7}[pnbrqkPNBRQK1-8]+)(?:\s|$)")
+
+
+@lru_cache(maxsize=1024)
+def _decode_rank(rank_str: str) -> Tuple[Tuple[Optional[str], ...], bytes, int]:
+    """
+    Decode one rank of the piece placement field.
+
+    Ranks repeat a lot between positions ('8', 'pppppppp', ...), so results
+    are memoized and most ranks are decoded with a single lookup.
+
+    Returns:
+        Tuple of (squares, rank_bytes, count): the first 8 squares of the
+        rank as piece characters or None, the same squares as bytes (0 for
+        empty squares), and the number of squares the rank describes
+
+    Raises:
+        ValueError: If the rank contains an invalid character or count
+    """
+    if not _RANK_CHARS.issuperset(rank_str):
+        char = next(c for c in rank_str if c not in _RANK_CHARS)
+        if char in "09":
+            raise ValueError(f"Invalid empty square count: {char}")
+        raise ValueError(f"Invalid character in FEN: '{char}'")
+    
+    # Digits are expanded in C by str.translate, one NUL per empty square
+    expanded = rank_str.translate(_EXPAND)
+    squares = tuple(None if char == "\0" else char for char in expanded[:8])
+    return squares, expanded[:8].encode("ascii"), len(expanded)
+
+
+def _split_ranks(fen: str) -> List[str]:
+    """
+    Split the piece placement field of a FEN string into its 8 ranks.
+
+    Raises:
+        ValueError: If the FEN string is empty or does not have 8 ranks
+    """
+    # Common case: a well-formed placement field, matched by the regex in C
+    match = _PLACEMENT_RE.match(fen)
+    if match:
+        return match.group(1).split('/')
+    
+    # Otherwise fall back to the checks below to report what is wrong
+    parts = fen.strip().split()
+    if not parts:
+        raise ValueError("Empty FEN string")
+    
+    board_fen = parts[0]
+    
+    # Split by ranks (separated by '/')
+    ranks = board_fen.split('/')
+    if len(ranks) != 8:
+        raise ValueError(f"FEN must have 8 ranks, got {len(ranks)}")
+    
+    return ranks
+
+
 def decode_fen(fen: str) -> List[List[Optional[str]]]:
     """
     Decode a FEN string into an 8x8 board representation.
@@ -399,47 +642,64 @@ def decode_fen(fen: str) -> List[List[Optional[str]]]:
         >>> board[3][3]  # d5 square (empty in starting position)
         None
     """
-    # Split FEN string to get just the board position (first part)
-    parts = fen.strip().split()
-    if not parts:
-        raise ValueError("Empty FEN string")
-    
-    board_fen = parts[0]
+    board: List[List[Optional[str]]] = []
     
-    # Split by ranks (separated by '/')
-    ranks = board_fen.split('/')
-    if len(ranks) != 8:
-        raise ValueError(f"FEN must have 8 ranks, got {len(ranks)}")
+    for rank_idx, rank_str in enumerate(_split_ranks(fen)):
+        squares, _, count = _decode_rank(rank_str)
+        if count != 8:
+            raise ValueError(f"Rank {rank_idx + 1} has {count} squares, expected 8")
+        
+        # Copy the memoized squares, callers may modify the board
+        board.append(list(squares))
     
-    board: List[List[Optional[str]]] = []
+    return board
+
+
+def decode_fen_bytes(fen: str) -> bytearray:
+    """
+    Decode a FEN string into a flat 64-byte board representation.
+
+    Compact alternative to decode_fen for code that handles many positions:
+    one contiguous buffer instead of 72 Python objects per board.
     
-    for rank_idx, rank_str in enumerate(ranks):
-        rank: List[Optional[str]] = []
+    Args:
+        fen: FEN string representing the chess position
         
-        for char in rank_str:
-            if char.isdigit():
-                # Number represents empty squares
-                empty_count = int(char)
-                if empty_count < 1 or empty_count > 8:
-                    raise ValueError(f"Invalid empty square count: {empty_count}")
-                rank.extend([None] * empty_count)
-            elif char in 'pnbrqkPNBRQK':
-                # Valid piece character
-                rank.append(char)
-            else:
-                raise ValueError(f"Invalid character in FEN: '{char}'")
+    Returns:
+        bytearray of length 64 indexed as board[rank * 8 + file], with the
+        same rank and file order as decode_fen. Each byte is either the
+        ASCII code of a piece character ('P', 'n', ...) or 0 for an empty
+        square.
         
-        if len(rank) != 8:
-            raise ValueError(f"Rank {rank_idx + 1} has {len(rank)} squares, expected 8")
+    Raises:
+        ValueError: If the FEN string is invalid
         
-        board.append(rank)
+    Example:
+        >>> board = decode_fen_bytes("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+        >>> chr(board[0 * 8 + 0])  # a8 square
+        'r'
+        >>> board[3 * 8 + 3]  # d5 square (empty in starting position)
+        0
+    """
+    board = bytearray()
+    
+    for rank_idx, rank_str in enumerate(_split_ranks(fen)):
+        _, rank_bytes, count = _decode_rank(rank_str)
+        if count != 8:
+            raise ValueError(f"Rank {rank_idx + 1} has {count} squares, expected 8")
+        
+        board += rank_bytes
     
     return board
 
 
+@lru_cache(maxsize=4096)
 def update_fen(fen: str, move: str) -> str:
     """
     Update a FEN string by applying a move in UCI notation.
+
+    Results are memoized, so replaying a known move from a known position
+    skips FEN parsing and move generation entirely.
     
     Args:
         fen: FEN string representing the current chess position
@@ -464,6 +724,31 @@ def update_fen(fen: str, move: str) -> str:
     except ValueError as e:
         raise ValueError(f"Invalid FEN string: {e}")
     
+    return update_fen_board(board, move)
+
+
+def update_fen_board(board: chess.Board, move: str) -> str:
+    """
+    Apply a move in UCI notation to an already parsed board.
+
+    Same as update_fen, but avoids parsing the FEN again when the caller
+    already holds a board. The board is modified in place.
+    
+    Args:
+        board: Board representing the current chess position
+        move: Move in UCI notation (e.g., 'e2e4', 'e7e8q')
+        
+    Returns:
+        New FEN string after applying the move
+        
+    Raises:
+        ValueError: If the move is invalid or illegal
+        
+    Example:
+        >>> board = chess.Board()
+        >>> update_fen_board(board, "e2e4")
+        'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1'
+    """
     try:
         # Parse the move in UCI notation
         chess_move = chess.Move.from_uci(move)
@@ -472,7 +757,7 @@ def update_fen(fen: str, move: str) -> str:
     
     # Check if the move is legal
     if chess_move not in board.legal_moves:
-        raise ValueError(f"Illegal move: {move} in position {fen}")
+        raise ValueError(f"Illegal move: {move} in position {board.fen()}")
     
     # Apply the move
     board.push(chess_move)
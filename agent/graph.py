@@ -1,13 +1,19 @@
-from agent.chess_api import update_fen, get_best_move as api_get_best_move
-from langchain_core.messages import SystemMessage
+from agent.chess_api import (
+    get_best_move as api_get_best_move,
+    get_full_analysis as api_get_full_analysis,
+    check_for_mate as api_check_for_mate,
+)
+from langchain_core.messages import SystemMessage, ToolMessage
 from langchain_core.tools import tool
-from langgraph.prebuilt import ToolNode
 import chess
-from typing import TypedDict, Annotated
+from typing import TypedDict, Annotated, Optional, Any, Dict
+from itertools import islice
+from functools import lru_cache
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, END, add_messages
-from langgraph.prebuilt import ToolNode
 from dotenv import load_dotenv
+import asyncio
+import json
 import os
 import logging
 
@@ -43,6 +49,11 @@ else:
 class ChessState(TypedDict):
     messages: Annotated[list, add_messages]
     current_position: str  # FEN or None if no game
+    # Live board for current_position, so moves do not require parsing the FEN
+    board: Optional[chess.Board]
+    # Analysis requested ahead of time for the position after the user's move
+    pending_analysis: Optional[asyncio.Task]
+    pending_analysis_fen: Optional[str]
 
 
 @tool
@@ -95,6 +106,37 @@ async def tool_get_best_move(fen: str) -> str:
     move = await api_get_best_move(fen=fen)
     return move
 
+@tool
+async def tool_get_full_analysis(fen: str) -> Dict[str, Any]:
+    """
+    Analyze the current position using Stockfish. Returns the best move together with the evaluation,
+    so use this tool instead of tool_get_best_move when you want to comment on the position.
+    fen is the FEN-string representing the current position (see tool_get_best_move for the format).
+
+    Args:
+        fen: FEN string representing the current chess position after the user's move.
+
+    Returns:
+        Dictionary with fields:
+        - move: Best move in UCI notation (e.g., 'e2e4')
+        - san: Best move in short algebraic notation (e.g., 'e4')
+        - eval: Position evaluation in pawns (negative = black winning)
+        - winChance: White's winning chance in percent (50 = equal)
+        - mate: Forced mate in N moves (negative for black), or null
+        - continuation: First moves of the best line in UCI notation
+    """
+    result = await api_get_full_analysis(fen=fen)
+    # Same analysis, answered from the cache; check_for_mate normalizes the field
+    mate = await api_check_for_mate(fen=fen)
+    return {
+        "move": result.get("move", ""),
+        "san": result.get("san", ""),
+        "eval": result.get("eval", 0.0),
+        "winChance": result.get("winChance", 50.0),
+        "mate": mate,
+        "continuation": result.get("continuationArr", [])[:5],
+    }
+
 @tool
 async def tool_register_user_move(move: str) -> str:
     """
@@ -143,13 +185,16 @@ async def tool_make_move(move: str) -> str:
     """
     return move
 
-def validate_move(move: str, current_position: str) -> tuple[bool, str]:
+def apply_move(board: chess.Board, move: str) -> tuple[bool, str]:
     """
-    Validate if a move is legal in the given position.
+    Validate a move and push it onto the board if it is legal.
+
+    Legality is checked only once and the board is updated in place, so no
+    FEN has to be parsed.
     
     Args:
+        board: Board holding the current position; modified in place
         move: Move in UCI notation (e.g., 'e2e4')
-        current_position: FEN string representing the current position
     
     Returns:
         Tuple of (is_valid, message):
@@ -157,41 +202,112 @@ def validate_move(move: str, current_position: str) -> tuple[bool, str]:
         - If invalid: (False, error_message)
     """
     try:
-        board = chess.Board(current_position)
         chess_move = chess.Move.from_uci(move)
-        
-        if chess_move not in board.legal_moves:
-            # Move is illegal - generate helpful error message
-            legal_moves_list = list(board.legal_moves)
-            legal_moves_str = ", ".join([m.uci() for m in legal_moves_list[:10]])
-            if len(legal_moves_list) > 10:
-                legal_moves_str += ", ..."
-            
-            error_msg = (f"ERROR: Illegal move '{move}' in position {current_position}. "
-                       f"Legal moves include: {legal_moves_str}")
-            return False, error_msg
-        
-        # Move is legal
-        return True, move
-        
     except ValueError as e:
         # Invalid move format
         error_msg = f"ERROR: Invalid move format '{move}': {str(e)}"
         return False, error_msg
 
+    if chess_move not in board.legal_moves:
+        # Move is illegal - generate helpful error message, generating at
+        # most one move more than shown
+        legal_moves_list = list(islice(board.legal_moves, 11))
+        legal_moves_str = ", ".join([m.uci() for m in legal_moves_list[:10]])
+        if len(legal_moves_list) > 10:
+            legal_moves_str += ", ..."
+        
+        error_msg = (f"ERROR: Illegal move '{move}' in position {board.fen()}. "
+                   f"Legal moves include: {legal_moves_str}")
+        return False, error_msg
+    
+    # Move is legal
+    board.push(chess_move)
+    return True, move
+
+
+# Tools callable by the LLM; bound to the model and dispatched from the same
+# list so the two cannot drift apart
+TOOLS = (
+    tool_get_best_move,
+    tool_get_full_analysis,
+    tool_register_user_move,
+    tool_make_move,
+)
+
+# Dispatch table built once at import, looked up by name for each tool call
+_TOOLS_BY_NAME = {t.name: t for t in TOOLS}
+
+# Upper bound for a single tool call, in seconds
+_TOOL_TIMEOUT = 60
+
+
+async def _dispatch(tool_call: dict) -> ToolMessage:
+    """
+    Run a single tool call and wrap its outcome in a ToolMessage.
+
+    Errors are reported back to the LLM as the message content instead of
+    being raised, so that one failing call does not abort the others.
+    """
+    name = tool_call["name"]
+    selected_tool = _TOOLS_BY_NAME.get(name)
+    if selected_tool is None:
+        content = f"Error: {name} is not a valid tool, try one of {list(_TOOLS_BY_NAME)}."
+        return ToolMessage(content=content, name=name, tool_call_id=tool_call["id"], status="error")
+
+    try:
+        output = await asyncio.wait_for(selected_tool.ainvoke(tool_call["args"]), timeout=_TOOL_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"Tool {name} timed out after {_TOOL_TIMEOUT}s")
+        content = f"Error: {name} timed out. Please try again."
+        return ToolMessage(content=content, name=name, tool_call_id=tool_call["id"], status="error")
+    except Exception as e:
+        logger.warning(f"Tool {name} failed: {e}")
+        content = f"Error: {e!r}\n Please fix your mistakes."
+        return ToolMessage(content=content, name=name, tool_call_id=tool_call["id"], status="error")
+
+    content = output if isinstance(output, str) else json.dumps(output)
+    return ToolMessage(content=content, name=name, tool_call_id=tool_call["id"])
+
+
+def _consume_prefetch_result(task: asyncio.Task) -> None:
+    """Retrieve the outcome of a prefetch task so failures are not reported as unhandled."""
+    if not task.cancelled() and task.exception() is not None:
+        logger.debug(f"Analysis prefetch failed: {task.exception()}")
+
+
+def _prefetch_analysis(fen: str) -> asyncio.Task:
+    """
+    Start analyzing a position in the background.
+
+    The result lands in the chess_api analysis cache, which both
+    tool_get_best_move and tool_get_full_analysis read from. A tool call made
+    while the request is still running waits for it instead of sending a
+    second one.
+    """
+    task = asyncio.create_task(api_get_full_analysis(fen=fen))
+    task.add_done_callback(_consume_prefetch_result)
+    return task
+
+
 # Custom tools node that also updates position
 async def tools_node(state: ChessState):
     """Execute tools and update position for move tools."""
     logger.debug("Executing tools node")
-    # Execute the tools
-    tool_executor = ToolNode([tool_get_best_move, tool_register_user_move, tool_make_move])
-    result = await tool_executor.ainvoke(state)
-    logger.debug(f"Tools node result: {result}")
+    pending_analysis = state.get("pending_analysis")
+    pending_analysis_fen = state.get("pending_analysis_fen")
+
+    # Execute all tool calls of the last AI message concurrently; gather keeps
+    # the results in the order of the calls
+    tool_calls = state["messages"][-1].tool_calls
+    new_messages = list(await asyncio.gather(
+        *(_dispatch(tc) for tc in tool_calls)
+    ))
+    logger.debug(f"Tools node result: {new_messages}")
 
     # Update position based on new tool messages
     current_position = state["current_position"]
-    # ToolNode returns only the new tool response messages
-    new_messages = result["messages"]
+    board = state.get("board")
+    user_move_registered = False
     
     for msg in new_messages:
         if msg.type == "tool":
@@ -201,22 +317,44 @@ async def tools_node(state: ChessState):
                 move = msg.content
                 if current_position is None:
                     current_position = chess.STARTING_FEN
+                if board is None or board.fen() != current_position:
+                    # The position was set outside of the graph, e.g. a new game
+                    try:
+                        board = chess.Board(current_position)
+                    except ValueError as e:
+                        msg.content = f"ERROR: Invalid position {current_position}: {str(e)}"
+                        logger.warning(f"Cannot apply {tool_name}: {msg.content}")
+                        continue
                 
-                # Validate the move before updating position
-                is_valid, result_msg = validate_move(move, current_position)
+                # Validate the move and update position if it is legal
+                is_valid, result_msg = apply_move(board, move)
                 
                 if not is_valid:
                     # Replace tool response with error message
                     msg.content = result_msg
                     logger.warning(f"Tool {tool_name} attempted illegal move: {move}")
                 else:
-                    # Move is valid - update position
-                    current_position = update_fen(current_position, move)
+                    current_position = board.fen()
                     logger.debug(f"Updated position after {tool_name}: {current_position}")
+                    user_move_registered = tool_name == "tool_register_user_move"
+
+    # Drop a prefetched analysis that no longer matches the position
+    if pending_analysis is not None and pending_analysis_fen != current_position:
+        pending_analysis.cancel()
+        pending_analysis = pending_analysis_fen = None
+
+    # The engine's reply is almost always requested right after the user's
+    # move, so start computing it while the LLM is still thinking
+    if user_move_registered and pending_analysis is None:
+        pending_analysis = _prefetch_analysis(current_position)
+        pending_analysis_fen = current_position
     
     return {
         "messages": new_messages,
         "current_position": current_position,
+        "board": board,
+        "pending_analysis": pending_analysis,
+        "pending_analysis_fen": pending_analysis_fen,
     }
 
 
@@ -235,28 +373,55 @@ else:
         api_key=OPENAI_API_KEY
     )
 
-llm_with_tools = llm.bind_tools([
-    tool_get_best_move,
-    tool_register_user_move,
-    tool_make_move,
-])
+llm_with_tools = llm.bind_tools(list(TOOLS))
+
+# Number of most recent messages sent to the LLM besides the system prompt.
+# The current position is always part of the input, so older turns are not
+# needed to know the state of the game.
+_MAX_HISTORY = 20
+
+
+def _trim_history(messages: list) -> list:
+    """
+    Keep the system prompt and the most recent messages of the conversation.
+
+    The window never starts with a tool message, since tool results must
+    follow the AI message that requested them.
+    """
+    if len(messages) <= _MAX_HISTORY + 1:
+        return messages.copy()
+
+    start = len(messages) - _MAX_HISTORY
+    while start < len(messages) and messages[start].type == "tool":
+        start += 1
+    return [messages[0], *messages[start:]]
+
+
+_POS_TEMPLATE = (
+    'Current board position (FEN): {"fen": "%s"}\n'
+    'Use this FEN when calling tool_get_full_analysis or tool_get_best_move.'
+)
+
+
+@lru_cache(maxsize=32)
+def _position_message(current_position: Optional[str]) -> SystemMessage:
+    """Build the message telling the LLM the current position, reused per FEN."""
+    return SystemMessage(content=_POS_TEMPLATE % current_position)
+
 
 async def agent_node(state: ChessState):
     logger.debug("Agent node starts")
     logger.debug(f"Agent node state: {state}")
     
     # Prepare messages with current position context
-    messages = state["messages"].copy()
+    messages = _trim_history(state["messages"])
     
-    # Add current position to the context if available
+    # Add current position to the context if available. The message is only
+    # part of this LLM input, never of the stored history, so the LLM always
+    # sees exactly one position.
     current_position = state.get("current_position")
-    # Insert position info after system message but before other messages
-    position_msg = SystemMessage(
-        content=f"Current board position (FEN): {{\"fen\": \"{current_position}\"}}\n"
-                f"Use this FEN when calling tool_get_best_move."
-    )
-
-    messages = messages + [position_msg]  # after the system message
+    # _trim_history returned a fresh list, so it can be extended in place
+    messages.append(_position_message(current_position))
 
     logger.debug(f"LLM input messages: {messages}")
 
@@ -5,6 +5,18 @@ This script tests the Chess-API integration with various positions.
 """
 
 import asyncio
+import contextlib
+import contextvars
+import functools
+import logging
+import os
+import shelve
+import sys
+import traceback
+import chess
+from dataclasses import dataclass
+from typing import Literal
+from agent import chess_api
 from agent.chess_api import (
     analyze_position,
     get_best_move,
@@ -15,225 +27,280 @@ from agent.chess_api import (
     get_continuation,
     analyze_specific_moves,
     decode_fen,
+    decode_fen_bytes,
     update_fen,
+    close_session,
+    analysis_cache_info,
     ChessAPIError
 )
 
 
-async def test_basic_analysis():
-    """Test basic position analysis."""
-    print("=" * 60)
-    print("TEST 1: Basic Position Analysis")
-    print("=" * 60)
-    
-    # Starting position
-    fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
-    print(f"Position: Starting position")
-    print(f"FEN: {fen}\n")
-    
-    try:
-        result = await analyze_position(fen=fen, depth=12)
-        print(f"✓ Analysis successful!")
-        print(f"  Best move (UCI): {result.get('move')}")
-        print(f"  Best move (SAN): {result.get('san')}")
-        print(f"  Evaluation: {result.get('eval')}")
-        print(f"  Win chance: {result.get('winChance'):.2f}%")
-        print(f"  Depth: {result.get('depth')}")
-        print(f"  Text: {result.get('text')}")
-        print(f"  Continuation: {' '.join(result.get('continuationArr', [])[:5])}")
-        return True
-    except ChessAPIError as e:
-        print(f"✗ Error: {e}")
-        return False
+# Engine depth used by the API tests. A shallow search gives the same
+# correctness signal at a fraction of the server time; set
+# CHESS_API_TEST_DEPTH=12 or higher for a full run.
+DEPTH = int(os.environ.get("CHESS_API_TEST_DEPTH", "8"))
 
+# Set CHESS_API_TEST_LOGLEVEL=WARNING to show only failures (e.g. in CI)
+logging.basicConfig(
+    level=os.environ.get("CHESS_API_TEST_LOGLEVEL", "INFO"),
+    format="%(message)s",
+    stream=sys.stdout,
+)
+log = logging.getLogger(__name__)
+
+# Optional on-disk store of API responses, e.g. CHESS_API_TEST_CACHE=.chess_api_cache.
+# Test positions never change, so repeated runs can skip the network
+# entirely. Responses are keyed by all request arguments including the API
+# URL, so a changed DEPTH or CHESS_API_URL queries the API again; delete the
+# file to pick up changed API behaviour at the same URL.
+CACHE_PATH = os.environ.get("CHESS_API_TEST_CACHE")
+
+# Positions shared by the tests
+STARTPOS_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+AFTER_E4_FEN = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+# After 1.e4 e5 2.Nf3 Nf6
+PETROV_FEN = "rnbqkb1r/pppp1ppp/5n2/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 0 1"
+# Scholar's mate setup, white mates in one with Qxf7#
+SCHOLAR_FEN = "r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4"
+# Complex endgame from the Chess-API documentation
+COMPLEX_FEN = "8/1P1R4/n1r2B2/3Pp3/1k4P1/6K1/Bppr1P2/2q5 w - - 0 1"
+EMPTY_FEN = "8/8/8/8/8/8/8/8 w - - 0 1"
+
+# Expected flat boards (a8..h1, empty squares as NUL) for the decode tests
+STARTPOS_BYTES = b"rnbqkbnrpppppppp" + b"\0" * 32 + b"PPPPPPPPRNBQKBNR"
+SCHOLAR_BYTES = (
+    b"r\0bqkb\0r" b"pppp\0ppp" b"\0\0n\0\0n\0\0" b"\0\0\0\0p\0\0Q"
+    b"\0\0B\0P\0\0\0" + b"\0" * 8 + b"PPPP\0PPP" b"RNB\0K\0NR"
+)
 
-async def test_get_best_move():
-    """Test getting best move."""
-    print("\n" + "=" * 60)
-    print("TEST 2: Get Best Move")
-    print("=" * 60)
-    
-    # Position after 1.e4 (correct FEN without invalid en passant)
-    fen = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
-    print(f"Position: After 1.e4")
-    print(f"FEN: {fen}\n")
+
+@dataclass(frozen=True, slots=True)
+class Case:
+    """One Chess-API test: a position and the kind of check to run on it."""
+    name: str
+    title: str
+    position: str
+    fen: str
+    kind: Literal["analyze", "bestmove", "eval", "mate", "cont", "specific"]
+    extra: tuple = ()
+
+
+async def _check_analyze(case):
+    """Analyze the position and report the full result."""
+    result = await analyze_position(fen=case.fen, depth=DEPTH)
+    log.info("✓ Analysis successful!")
+    log.info("  Best move: %s (%s)", result.get('san'), result.get('move'))
+    log.info("  Evaluation: %.2f", result.get('eval', 0.0))
+    log.info("  Win chance: %.2f%%", result.get('winChance', 50.0))
+    log.info("  Depth: %s", result.get('depth'))
+    log.info("  Text: %s", result.get('text'))
+    log.info("  Continuation: %s", ' '.join(result.get('continuationArr', [])[:5]))
+    
+    mate_in = result.get('mate')
+    if mate_in:
+        log.info("  Mate in: %s moves", abs(mate_in))
+    return True
+
+
+async def _check_best_move(case):
+    """Check that the best-move helpers return a legal move and its SAN."""
+    # Both helpers read the same analysis, so this sends one request
+    move_uci = await get_best_move(fen=case.fen, depth=DEPTH)
+    move_san = await get_best_move_san(fen=case.fen, depth=DEPTH)
+    log.info("✓ Best move retrieved!")
+    log.info("  UCI notation: %s", move_uci)
+    log.info("  SAN notation: %s", move_san)
+    
+    if not move_uci or not move_san:
+        log.warning("  ⚠️ Warning: Empty move returned!")
+        return False
     
+    board = chess.Board(case.fen)
     try:
-        move_uci = await get_best_move(fen=fen, depth=12)
-        move_san = await get_best_move_san(fen=fen, depth=12)
-        print(f"✓ Best move retrieved!")
-        print(f"  UCI notation: {move_uci}")
-        print(f"  SAN notation: {move_san}")
-        
-        if not move_uci or not move_san:
-            print(f"  ⚠️ Warning: Empty move returned!")
-            return False
-        return True
-    except ChessAPIError as e:
-        print(f"✗ Error: {e}")
+        move = chess.Move.from_uci(move_uci)
+    except ValueError:
+        move = None
+    if move not in board.legal_moves:
+        log.error("  ✗ %s is not a legal move in this position!", move_uci)
         return False
+    if board.san(move) != move_san:
+        log.error("  ✗ SAN %s does not match %s (%s)!", move_san, move_uci, board.san(move))
+        return False
+    return True
 
 
-async def test_evaluation():
-    """Test position evaluation."""
-    print("\n" + "=" * 60)
-    print("TEST 3: Position Evaluation")
-    print("=" * 60)
-    
-    # Slightly better position for white
-    fen = "rnbqkb1r/pppp1ppp/5n2/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 0 1"
-    print(f"Position: After 1.e4 e5 2.Nf3 Nf6")
-    print(f"FEN: {fen}\n")
+async def _check_evaluation(case):
+    """Check that the evaluation helpers return numbers in range."""
+    # Both helpers read the same analysis, so this sends one request
+    eval_score = await get_position_evaluation(fen=case.fen, depth=DEPTH)
+    win_chance = await get_win_chance(fen=case.fen, depth=DEPTH)
+    log.info("✓ Evaluation retrieved!")
+    log.info("  Evaluation: %s", eval_score)
+    log.info("  Win chance: %s%%", win_chance)
     
-    try:
-        eval_score = await get_position_evaluation(fen=fen, depth=12)
-        win_chance = await get_win_chance(fen=fen, depth=12)
-        print(f"✓ Evaluation retrieved!")
-        print(f"  Evaluation: {eval_score:.2f}")
-        print(f"  Win chance: {win_chance:.2f}%")
-        
-        if eval_score > 0:
-            print(f"  → White is better")
-        elif eval_score < 0:
-            print(f"  → Black is better")
-        else:
-            print(f"  → Position is equal")
-        return True
-    except ChessAPIError as e:
-        print(f"✗ Error: {e}")
+    if not isinstance(eval_score, (int, float)) or not isinstance(win_chance, (int, float)):
+        log.error("  ✗ Evaluation and win chance should be numbers!")
+        return False
+    if not 0 <= win_chance <= 100:
+        log.error("  ✗ Win chance should be a percentage!")
         return False
+    
+    if eval_score > 0:
+        log.info("  → White is better")
+    elif eval_score < 0:
+        log.info("  → Black is better")
+    else:
+        log.info("  → Position is equal")
+    return True
 
 
-async def test_mate_detection():
-    """Test mate detection."""
-    print("\n" + "=" * 60)
-    print("TEST 4: Mate Detection")
-    print("=" * 60)
-    
-    # Scholar's mate position (mate in 1)
-    fen = "r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4"
-    print(f"Position: Scholar's mate setup (Qh5, Bc4 vs ...Nc6, Nf6)")
-    print(f"FEN: {fen}\n")
-    
-    try:
-        mate_in = await check_for_mate(fen=fen, depth=12)
-        print(f"✓ Mate check completed!")
-        if mate_in is not None:
-            if mate_in > 0:
-                print(f"  → White mates in {mate_in} move(s)")
-            else:
-                print(f"  → Black mates in {abs(mate_in)} move(s)")
+async def _check_mate(case):
+    """Report whether the engine found a forced mate."""
+    mate_in = await check_for_mate(fen=case.fen, depth=DEPTH)
+    log.info("✓ Mate check completed!")
+    if mate_in is not None:
+        if mate_in > 0:
+            log.info("  → White mates in %s move(s)", mate_in)
         else:
-            print(f"  → No forced mate detected")
-        return True
-    except ChessAPIError as e:
-        print(f"✗ Error: {e}")
+            log.info("  → Black mates in %s move(s)", abs(mate_in))
+    else:
+        log.info("  → No forced mate detected")
+    return True
+
+
+async def _check_continuation(case):
+    """Report the engine's principal variation."""
+    continuation = await get_continuation(fen=case.fen, depth=DEPTH)
+    log.info("✓ Continuation retrieved!")
+    log.info("  Best line: %s", ' '.join(continuation[:8]))
+    log.info("  (%s moves total)", len(continuation))
+    return True
+
+
+async def _check_specific_moves(case):
+    """Analyze only the moves listed in case.extra."""
+    result = await analyze_specific_moves(fen=case.fen, moves=list(case.extra), depth=DEPTH)
+    log.info("✓ Specific moves analyzed!")
+    log.info("  Best of specified moves: %s (%s)", result.get('san'), result.get('move'))
+    log.info("  Evaluation: %.2f", result.get('eval', 0.0))
+    return True
+
+
+_CHECKS = {
+    "analyze": _check_analyze,
+    "bestmove": _check_best_move,
+    "eval": _check_evaluation,
+    "mate": _check_mate,
+    "cont": _check_continuation,
+    "specific": _check_specific_moves,
+}
+
+CASES = [
+    Case("Basic Analysis", "TEST 1: Basic Position Analysis",
+         "Starting position", STARTPOS_FEN, "analyze"),
+    Case("Get Best Move", "TEST 2: Get Best Move",
+         "After 1.e4", AFTER_E4_FEN, "bestmove"),
+    Case("Position Evaluation", "TEST 3: Position Evaluation",
+         "After 1.e4 e5 2.Nf3 Nf6", PETROV_FEN, "eval"),
+    Case("Mate Detection", "TEST 4: Mate Detection",
+         "Scholar's mate setup (Qh5, Bc4 vs ...Nc6, Nf6)", SCHOLAR_FEN, "mate"),
+    Case("Continuation Line", "TEST 5: Continuation Line",
+         "Starting position", STARTPOS_FEN, "cont"),
+    Case("Specific Moves", "TEST 6: Analyze Specific Moves",
+         "Starting position", STARTPOS_FEN, "specific", ("e2e4", "d2d4", "g1f3")),
+    Case("Complex Position", "TEST 7: Complex Position",
+         "Complex endgame", COMPLEX_FEN, "analyze"),
+]
+
+
+# Log records held back for the case running in the current task, if any
+_CASE_RECORDS = contextvars.ContextVar("case_records", default=None)
+
+
+class _CaseBuffer(logging.Filter):
+    """Divert log records of a running case into its buffer; see run()."""
+
+    def filter(self, record):
+        records = _CASE_RECORDS.get()
+        if records is None:
+            return True
+        records.append(record)
         return False
 
 
-async def test_continuation():
-    """Test getting continuation line."""
-    print("\n" + "=" * 60)
-    print("TEST 5: Continuation Line")
-    print("=" * 60)
-    
-    fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
-    print(f"Position: Starting position")
-    print(f"FEN: {fen}\n")
-    
-    try:
-        continuation = await get_continuation(fen=fen, depth=12)
-        print(f"✓ Continuation retrieved!")
-        print(f"  Best line: {' '.join(continuation[:8])}")
-        print(f"  ({len(continuation)} moves total)")
-        return True
-    except ChessAPIError as e:
-        print(f"✗ Error: {e}")
-        return False
+log.addFilter(_CaseBuffer())
+
 
+async def run(case):
+    """
+    Run one Chess-API test case, buffering everything it logs.
 
-async def test_specific_moves():
-    """Test analyzing specific moves."""
-    print("\n" + "=" * 60)
-    print("TEST 6: Analyze Specific Moves")
-    print("=" * 60)
+    Cases run concurrently, so their output is held back rather than
+    interleaved. Returns a tuple of (result, records); pass the records to
+    log.handle to emit them.
+    """
+    # Each gathered case runs in its own task, with its own context
+    records = []
+    _CASE_RECORDS.set(records)
+    log.info("\n" + "=" * 60)
+    log.info(case.title)
+    log.info("=" * 60)
     
-    fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
-    moves = ["e2e4", "d2d4", "g1f3"]
-    print(f"Position: Starting position")
-    print(f"Analyzing only: {', '.join(moves)}")
-    print(f"FEN: {fen}\n")
+    log.info("Position: %s", case.position)
+    if case.extra:
+        log.info("Analyzing only: %s", ', '.join(case.extra))
+    log.info("FEN: %s\n", case.fen)
     
     try:
-        result = await analyze_specific_moves(fen=fen, moves=moves, depth=12)
-        print(f"✓ Specific moves analyzed!")
-        print(f"  Best of specified moves: {result.get('san')} ({result.get('move')})")
-        print(f"  Evaluation: {result.get('eval'):.2f}")
-        return True
+        result = await _CHECKS[case.kind](case)
     except ChessAPIError as e:
-        print(f"✗ Error: {e}")
-        return False
+        log.error("✗ Error: %s", e)
+        result = False
+    except Exception as e:
+        log.error("\n✗ Unexpected error in %s: %s", case.name, e)
+        result = False
+    return result, records
 
 
-async def test_complex_position():
-    """Test a complex middlegame position."""
-    print("\n" + "=" * 60)
-    print("TEST 7: Complex Position")
-    print("=" * 60)
-    
-    # Complex position from the API documentation
-    fen = "8/1P1R4/n1r2B2/3Pp3/1k4P1/6K1/Bppr1P2/2q5 w - - 0 1"
-    print(f"Position: Complex endgame")
-    print(f"FEN: {fen}\n")
-    
-    try:
-        result = await analyze_position(fen=fen, depth=12)
-        print(f"✓ Complex position analyzed!")
-        print(f"  Best move: {result.get('san')} ({result.get('move')})")
-        print(f"  Evaluation: {result.get('eval'):.2f}")
-        print(f"  Win chance: {result.get('winChance'):.2f}%")
-        print(f"  Text: {result.get('text')}")
-        
-        mate_in = result.get('mate')
-        if mate_in:
-            print(f"  Mate in: {abs(mate_in)} moves")
-        return True
-    except ChessAPIError as e:
-        print(f"✗ Error: {e}")
-        return False
+def square(board, rank, file):
+    """Return the piece on a square of a flat board, or None if it is empty."""
+    piece = board[rank * 8 + file]
+    return chr(piece) if piece else None
 
 
-def print_board(board):
-    """Print the board in a readable format."""
-    print("\n  a b c d e f g h")
-    print("  ---------------")
-    for rank_idx, rank in enumerate(board):
+@functools.lru_cache(maxsize=1024)
+def _render_board(board_bytes):
+    """Render a flat board as text; memoized since positions repeat."""
+    lines = ["", "  a b c d e f g h", "  ---------------"]
+    for rank_idx in range(8):
         rank_num = 8 - rank_idx
-        pieces = []
-        for piece in rank:
-            if piece is None:
-                pieces.append('.')
-            else:
-                pieces.append(piece)
-        print(f"{rank_num}|{' '.join(pieces)}|{rank_num}")
-    print("  ---------------")
-    print("  a b c d e f g h\n")
+        rank = board_bytes[rank_idx * 8:rank_idx * 8 + 8].decode("ascii").replace("\0", ".")
+        lines.append(f"{rank_num}|{' '.join(rank)}|{rank_num}")
+    lines += ["  ---------------", "  a b c d e f g h", ""]
+    return "\n".join(lines)
+
+
+def print_board(board):
+    """Log a flat or 8x8 board in a readable format."""
+    if not isinstance(board, (bytes, bytearray)):
+        board = bytes(ord(piece) if piece else 0 for rank in board for piece in rank)
+    log.info("%s", _render_board(bytes(board)))
 
 
 def test_decode_fen_starting_position():
     """Test decoding the starting position FEN."""
-    print("\n" + "=" * 60)
-    print("TEST 8: Decode FEN - Starting Position")
-    print("=" * 60)
+    log.info("\n" + "=" * 60)
+    log.info("TEST 8: Decode FEN - Starting Position")
+    log.info("=" * 60)
     
-    fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
-    print(f"FEN: {fen}\n")
+    fen = STARTPOS_FEN
+    log.info("FEN: %s\n", fen)
     
     try:
         board = decode_fen(fen)
-        print(f"✓ FEN decoded successfully!")
+        log.info("✓ FEN decoded successfully!")
         print_board(board)
-        print(f"  Board dimensions: {len(board)}x{len(board[0])}")
+        log.info("  Board dimensions: %sx%s", len(board), len(board[0]))
         
         # Verify key squares
         assert board[0][0] == 'r', "a8 should be black rook"
@@ -243,60 +310,58 @@ def test_decode_fen_starting_position():
         assert board[7][4] == 'K', "e1 should be white king"
         assert board[3][3] is None, "d5 should be empty"
         
-        print(f"  ✓ a8 = {board[0][0]} (black rook)")
-        print(f"  ✓ e8 = {board[0][4]} (black king)")
-        print(f"  ✓ e1 = {board[7][4]} (white king)")
-        print(f"  ✓ d5 = {board[3][3]} (empty)")
+        log.info("  ✓ a8 = %s (black rook)", board[0][0])
+        log.info("  ✓ e8 = %s (black king)", board[0][4])
+        log.info("  ✓ e1 = %s (white king)", board[7][4])
+        log.info("  ✓ d5 = %s (empty)", board[3][3])
         
         return True
     except Exception as e:
-        print(f"✗ Error: {e}")
-        import traceback
+        log.error("✗ Error: %s", e)
         traceback.print_exc()
         return False
 
 
 def test_decode_fen_after_e4():
     """Test decoding FEN after 1.e4."""
-    print("\n" + "=" * 60)
-    print("TEST 9: Decode FEN - After 1.e4")
-    print("=" * 60)
+    log.info("\n" + "=" * 60)
+    log.info("TEST 9: Decode FEN - After 1.e4")
+    log.info("=" * 60)
     
-    fen = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
-    print(f"FEN: {fen}\n")
+    fen = AFTER_E4_FEN
+    log.info("FEN: %s\n", fen)
     
     try:
         board = decode_fen(fen)
-        print(f"✓ FEN decoded successfully!")
+        log.info("✓ FEN decoded successfully!")
         print_board(board)
 
         # Verify the pawn moved
         assert board[4][4] == 'P', "e4 should have white pawn"
         assert board[6][4] is None, "e2 should be empty"
         
-        print(f"  ✓ e4 = {board[4][4]} (white pawn)")
-        print(f"  ✓ e2 = {board[6][4]} (empty)")
+        log.info("  ✓ e4 = %s (white pawn)", board[4][4])
+        log.info("  ✓ e2 = %s (empty)", board[6][4])
         
         return True
     except Exception as e:
-        print(f"✗ Error: {e}")
+        log.error("✗ Error: %s", e)
         return False
 
 
 def test_decode_fen_complex():
     """Test decoding a complex position."""
-    print("\n" + "=" * 60)
-    print("TEST 10: Decode FEN - Complex Position")
-    print("=" * 60)
+    log.info("\n" + "=" * 60)
+    log.info("TEST 10: Decode FEN - Complex Position")
+    log.info("=" * 60)
     
-    fen = "r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4"
-    print(f"FEN: {fen}\n")
+    fen = SCHOLAR_FEN
+    log.info("FEN: %s\n", fen)
     
     try:
         board = decode_fen(fen)
-        print(f"✓ FEN decoded successfully!")
+        log.info("✓ FEN decoded successfully!")
         print_board(board)
-
         
         # Verify some pieces
         assert board[3][7] == 'Q', "h5 should have white queen"
@@ -304,47 +369,47 @@ def test_decode_fen_complex():
         assert board[2][5] == 'n', "f6 should have black knight"
         assert board[2][2] == 'n', "c6 should have black knight"
         
-        print(f"  ✓ h5 = {board[3][7]} (white queen)")
-        print(f"  ✓ c4 = {board[4][2]} (white bishop)")
-        print(f"  ✓ f6 = {board[2][5]} (black knight)")
-        print(f"  ✓ c6 = {board[2][2]} (black knight)")
+        log.info("  ✓ h5 = %s (white queen)", board[3][7])
+        log.info("  ✓ c4 = %s (white bishop)", board[4][2])
+        log.info("  ✓ f6 = %s (black knight)", board[2][5])
+        log.info("  ✓ c6 = %s (black knight)", board[2][2])
         
         return True
     except Exception as e:
-        print(f"✗ Error: {e}")
+        log.error("✗ Error: %s", e)
         return False
 
 
 def test_decode_fen_empty_board():
     """Test decoding an empty board."""
-    print("\n" + "=" * 60)
-    print("TEST 11: Decode FEN - Empty Board")
-    print("=" * 60)
+    log.info("\n" + "=" * 60)
+    log.info("TEST 11: Decode FEN - Empty Board")
+    log.info("=" * 60)
     
-    fen = "8/8/8/8/8/8/8/8 w - - 0 1"
-    print(f"FEN: {fen}\n")
+    fen = EMPTY_FEN
+    log.info("FEN: %s\n", fen)
     
     try:
         board = decode_fen(fen)
-        print(f"✓ FEN decoded successfully!")
+        log.info("✓ FEN decoded successfully!")
         
         # Verify all squares are empty
-        empty_count = sum(1 for rank in board for square in rank if square is None)
+        empty_count = sum(rank.count(None) for rank in board)
         assert empty_count == 64, "All 64 squares should be empty"
         
-        print(f"  ✓ All {empty_count} squares are empty")
+        log.info("  ✓ All %s squares are empty", empty_count)
         
         return True
     except Exception as e:
-        print(f"✗ Error: {e}")
+        log.error("✗ Error: %s", e)
         return False
 
 
 def test_decode_fen_invalid():
     """Test error handling for invalid FEN strings."""
-    print("\n" + "=" * 60)
-    print("TEST 12: Decode FEN - Invalid Input Handling")
-    print("=" * 60)
+    log.info("\n" + "=" * 60)
+    log.info("TEST 12: Decode FEN - Invalid Input Handling")
+    log.info("=" * 60)
     
     invalid_fens = [
         ("", "Empty FEN"),
@@ -353,90 +418,253 @@ def test_decode_fen_invalid():
     
     all_passed = True
     for fen, description in invalid_fens:
-        print(f"\n  Testing: {description}")
+        log.info("\n  Testing: %s", description)
         try:
             decode_fen(fen)
-            print(f"  ✗ Should have raised ValueError!")
+            log.error("  ✗ Should have raised ValueError!")
             all_passed = False
         except ValueError as e:
-            print(f"  ✓ Correctly raised ValueError: {e}")
+            log.info("  ✓ Correctly raised ValueError: %s", e)
     
     return all_passed
 
 
 def test_update_fen_basic():
     """Test basic move application with update_fen."""
-    print("\n" + "=" * 60)
-    print("TEST 13: Update FEN - Basic Move")
-    print("=" * 60)
+    log.info("\n" + "=" * 60)
+    log.info("TEST 13: Update FEN - Basic Move")
+    log.info("=" * 60)
     
-    fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+    fen = STARTPOS_FEN
     move = "e2e4"
-    print(f"Starting FEN: {fen}")
-    print(f"Move: {move}\n")
+    log.info("Starting FEN: %s", fen)
+    log.info("Move: %s\n", move)
     
     try:
         new_fen = update_fen(fen, move)
-        print(f"✓ Move applied successfully!")
-        print(f"New FEN: {new_fen}\n")
+        log.info("✓ Move applied successfully!")
+        log.info("New FEN: %s\n", new_fen)
         
         # Verify the result - python-chess doesn't set en passant if no capture is possible
-        expected_fen = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+        expected_fen = AFTER_E4_FEN
         if new_fen == expected_fen:
-            print(f"  ✓ FEN matches expected result")
+            log.info("  ✓ FEN matches expected result")
             return True
         else:
-            print(f"  ✗ FEN mismatch!")
-            print(f"  Expected: {expected_fen}")
-            print(f"  Got:      {new_fen}")
+            log.error("  ✗ FEN mismatch!")
+            log.info("  Expected: %s", expected_fen)
+            log.info("  Got:      %s", new_fen)
             return False
     except Exception as e:
-        print(f"✗ Error: {e}")
-        import traceback
+        log.error("✗ Error: %s", e)
         traceback.print_exc()
         return False
 
 
 def test_update_fen_invalid_move():
     """Test error handling for invalid moves."""
-    print("\n" + "=" * 60)
-    print("TEST 14: Update FEN - Invalid Move Handling")
-    print("=" * 60)
+    log.info("\n" + "=" * 60)
+    log.info("TEST 14: Update FEN - Invalid Move Handling")
+    log.info("=" * 60)
     
-    fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+    fen = STARTPOS_FEN
     invalid_move = "e2e5"  # Illegal move - pawn can't jump
     
-    print(f"Starting FEN: {fen}")
-    print(f"Invalid move: {invalid_move} (pawn can't jump two squares to e5)\n")
+    log.info("Starting FEN: %s", fen)
+    log.info("Invalid move: %s (pawn can't jump two squares to e5)\n", invalid_move)
     
     try:
         update_fen(fen, invalid_move)
-        print(f"✗ Should have raised ValueError for illegal move!")
+        log.error("✗ Should have raised ValueError for illegal move!")
         return False
     except ValueError as e:
-        print(f"✓ Correctly raised ValueError: {e}")
+        log.info("✓ Correctly raised ValueError: %s", e)
+        return True
+    except Exception as e:
+        log.error("✗ Unexpected error: %s", e)
+        return False
+
+
+def test_decode_fen_bytes_starting_position():
+    """Test decoding the starting position FEN into a flat board."""
+    log.info("\n" + "=" * 60)
+    log.info("TEST 15: Decode FEN Bytes - Starting Position")
+    log.info("=" * 60)
+    
+    fen = STARTPOS_FEN
+    log.info("FEN: %s\n", fen)
+    
+    try:
+        board = decode_fen_bytes(fen)
+        log.info("✓ FEN decoded successfully!")
+        print_board(board)
+        log.info("  Board size: %s squares", len(board))
+        
+        # Verify every square at once
+        assert bytes(board) == STARTPOS_BYTES, "Board should match the starting position"
+        
+        log.info("  ✓ a8 = %s (black rook)", square(board, 0, 0))
+        log.info("  ✓ e8 = %s (black king)", square(board, 0, 4))
+        log.info("  ✓ e1 = %s (white king)", square(board, 7, 4))
+        log.info("  ✓ d5 = %s (empty)", square(board, 3, 3))
+        
+        return True
+    except Exception as e:
+        log.error("✗ Error: %s", e)
+        traceback.print_exc()
+        return False
+
+
+def test_decode_fen_bytes_after_e4():
+    """Test decoding FEN after 1.e4 into a flat board."""
+    log.info("\n" + "=" * 60)
+    log.info("TEST 16: Decode FEN Bytes - After 1.e4")
+    log.info("=" * 60)
+    
+    fen = AFTER_E4_FEN
+    log.info("FEN: %s\n", fen)
+    
+    try:
+        board = decode_fen_bytes(fen)
+        log.info("✓ FEN decoded successfully!")
+        print_board(board)
+
+        # Verify the pawn moved
+        assert square(board, 4, 4) == 'P', "e4 should have white pawn"
+        assert square(board, 6, 4) is None, "e2 should be empty"
+        
+        # The same board must come out of playing 1.e4 from the start
+        derived = decode_fen_bytes(update_fen(STARTPOS_FEN, "e2e4"))
+        assert board == derived, "Board should match 1.e4 played from the starting position"
+        
+        log.info("  ✓ e4 = %s (white pawn)", square(board, 4, 4))
+        log.info("  ✓ e2 = %s (empty)", square(board, 6, 4))
+        log.info("  ✓ Matches 1.e4 played from the starting position")
+        
+        return True
+    except Exception as e:
+        log.error("✗ Error: %s", e)
+        return False
+
+
+def test_decode_fen_bytes_complex():
+    """Test decoding a complex position into a flat board."""
+    log.info("\n" + "=" * 60)
+    log.info("TEST 17: Decode FEN Bytes - Complex Position")
+    log.info("=" * 60)
+    
+    fen = SCHOLAR_FEN
+    log.info("FEN: %s\n", fen)
+    
+    try:
+        board = decode_fen_bytes(fen)
+        log.info("✓ FEN decoded successfully!")
+        print_board(board)
+        
+        # Verify every square at once
+        assert bytes(board) == SCHOLAR_BYTES, "Board should match the expected position"
+        
+        log.info("  ✓ h5 = %s (white queen)", square(board, 3, 7))
+        log.info("  ✓ c4 = %s (white bishop)", square(board, 4, 2))
+        log.info("  ✓ f6 = %s (black knight)", square(board, 2, 5))
+        log.info("  ✓ c6 = %s (black knight)", square(board, 2, 2))
+        
+        return True
+    except Exception as e:
+        log.error("✗ Error: %s", e)
+        return False
+
+
+def test_decode_fen_bytes_empty_board():
+    """Test decoding an empty board into a flat board."""
+    log.info("\n" + "=" * 60)
+    log.info("TEST 18: Decode FEN Bytes - Empty Board")
+    log.info("=" * 60)
+    
+    fen = EMPTY_FEN
+    log.info("FEN: %s\n", fen)
+    
+    try:
+        board = decode_fen_bytes(fen)
+        log.info("✓ FEN decoded successfully!")
+        
+        # Verify all squares are empty
+        empty_count = board.count(0)
+        assert empty_count == 64, "All 64 squares should be empty"
+        
+        log.info("  ✓ All %s squares are empty", empty_count)
+        
         return True
     except Exception as e:
-        print(f"✗ Unexpected error: {e}")
+        log.error("✗ Error: %s", e)
         return False
 
 
+def test_decode_fen_nested():
+    """Test that decode_fen returns the same position as an 8x8 board."""
+    log.info("\n" + "=" * 60)
+    log.info("TEST 19: Decode FEN - Nested Board")
+    log.info("=" * 60)
+    
+    fen = SCHOLAR_FEN
+    log.info("FEN: %s\n", fen)
+    
+    try:
+        board = decode_fen(fen)
+        flat_board = decode_fen_bytes(fen)
+        
+        assert len(board) == 8 and all(len(rank) == 8 for rank in board), "Board should be 8x8"
+        for rank_idx in range(8):
+            for file_idx in range(8):
+                assert board[rank_idx][file_idx] == square(flat_board, rank_idx, file_idx), \
+                    f"Square ({rank_idx}, {file_idx}) differs from the flat board"
+        
+        log.info("✓ 8x8 board matches the flat board")
+        return True
+    except Exception as e:
+        log.error("✗ Error: %s", e)
+        return False
+
+
+@contextlib.contextmanager
+def persistent_responses(path):
+    """
+    Serve API responses from a shelve file at path, recording new ones.
+
+    Wraps chess_api's request function rather than analyze_position, so the
+    helpers that call analyze_position internally are covered too and the
+    in-process cache keeps working on top of it. Entries are keyed by every
+    request argument, api_url included. Yields a dict whose "hits" counts
+    the requests answered from the file.
+    """
+    request_analysis = chess_api._request_analysis
+    stats = {"hits": 0}
+    # Concurrent requests for the same key wait for the first one, so each
+    # key is requested and written once
+    locks = {}
+
+    async def cached_request(**kwargs):
+        key = repr(sorted(kwargs.items()))
+        async with locks.setdefault(key, asyncio.Lock()):
+            if key in shelf:
+                stats["hits"] += 1
+            else:
+                shelf[key] = await request_analysis(**kwargs)
+            return shelf[key]
+
+    with shelve.open(path) as shelf:
+        chess_api._request_analysis = cached_request
+        try:
+            yield stats
+        finally:
+            chess_api._request_analysis = request_analysis
+
+
 async def main():
     """Run all tests."""
-    print("\n" + "🦆" * 30)
-    print("CHESS-API.COM INTEGRATION TEST")
-    print("🦆" * 30 + "\n")
-    
-    # Async tests
-    async_tests = [
-        ("Basic Analysis", test_basic_analysis),
-        ("Get Best Move", test_get_best_move),
-        ("Position Evaluation", test_evaluation),
-        ("Mate Detection", test_mate_detection),
-        ("Continuation Line", test_continuation),
-        ("Specific Moves", test_specific_moves),
-        ("Complex Position", test_complex_position),
-    ]
+    log.info("\n" + "🦆" * 30)
+    log.info("CHESS-API.COM INTEGRATION TEST")
+    log.info("🦆" * 30)
     
     # Sync tests for decode_fen and update_fen
     sync_tests = [
@@ -447,49 +675,74 @@ async def main():
         ("Decode FEN - Invalid Input", test_decode_fen_invalid),
         ("Update FEN - Basic Move", test_update_fen_basic),
         ("Update FEN - Invalid Move", test_update_fen_invalid_move),
+        ("Decode FEN Bytes - Starting Position", test_decode_fen_bytes_starting_position),
+        ("Decode FEN Bytes - After 1.e4", test_decode_fen_bytes_after_e4),
+        ("Decode FEN Bytes - Complex Position", test_decode_fen_bytes_complex),
+        ("Decode FEN Bytes - Empty Board", test_decode_fen_bytes_empty_board),
+        ("Decode FEN - Nested Board", test_decode_fen_nested),
     ]
     
     results = []
     
-    # Run async tests
-    for name, test_func in async_tests:
-        try:
-            result = await test_func()
-            results.append((name, result))
-        except Exception as e:
-            print(f"\n✗ Unexpected error in {name}: {e}")
-            results.append((name, False))
-    
-    # Run sync tests
+    # Run async tests concurrently; each one waits on the network. All of
+    # them reuse the connections of chess_api's shared session, which is
+    # closed once they are done.
+    responses = (persistent_responses(CACHE_PATH) if CACHE_PATH
+                 else contextlib.nullcontext({"hits": 0}))
+    try:
+        with responses as stored:
+            gathered = await asyncio.gather(*map(run, CASES))
+    finally:
+        await close_session()
+    # Emit each case's output under its own header, in order
+    for case, (result, records) in zip(CASES, gathered):
+        for record in records:
+            log.handle(record)
+        results.append((case.name, result))
+    
+    # Run sync tests; each takes milliseconds, so they run in-process
     for name, test_func in sync_tests:
         try:
             result = test_func()
-            results.append((name, result))
         except Exception as e:
-            print(f"\n✗ Unexpected error in {name}: {e}")
-            import traceback
+            log.error("\n✗ Unexpected error in %s: %s", name, e)
             traceback.print_exc()
-            results.append((name, False))
+            result = False
+        results.append((name, result))
     
     # Summary
-    print("\n" + "=" * 60)
-    print("TEST SUMMARY")
-    print("=" * 60)
+    log.info("\n" + "=" * 60)
+    log.info("TEST SUMMARY")
+    log.info("=" * 60)
     
     passed = sum(1 for _, result in results if result)
     total = len(results)
     
     for name, result in results:
         status = "✓ PASS" if result else "✗ FAIL"
-        print(f"{status}: {name}")
+        log.info("%s: %s", status, name)
+    
+    log.info("\nTotal: %s/%s tests passed", passed, total)
     
-    print(f"\nTotal: {passed}/{total} tests passed")
+    # Cache misses that the response store answered never reached the API
+    cache_info = analysis_cache_info()
+    log.info("Chess-API requests: %s (%s calls served from cache)",
+             cache_info['misses'] - stored['hits'], cache_info['hits'])
+    if CACHE_PATH:
+        log.info("Responses reused from %s: %s", CACHE_PATH, stored['hits'])
     
     if passed == total:
-        print("\n🎉 All tests passed! Chess-API integration is working correctly.")
+        log.info("\n🎉 All tests passed! Chess-API integration is working correctly.")
     else:
-        print(f"\n⚠️  {total - passed} test(s) failed. Please check the errors above.")
+        log.warning("\n⚠️  %s test(s) failed. Please check the errors above.", total - passed)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    # uvloop is optional; it lowers the event loop overhead of the
+    # concurrent HTTP tests when installed
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
\ No newline at end of file